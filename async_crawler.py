@@ -0,0 +1,153 @@
+import asyncio
+import time
+from queue import Empty
+from concurrent.futures import ThreadPoolExecutor
+import aiohttp
+from crawler import Crawler
+from fetcher import Fetcher
+from blobs import BlobCache
+import database
+import metrics
+
+
+# asyncio engine, fetches of many hosts run concurrently on one event loop instead of one thread per fetch,
+# only pages that need a browser go to the (small) pool of render workers
+class AsyncCrawler(Crawler):
+
+    def __init__(self, seed_urls, concurrency=1000, per_host=2, render_workers=4, persist_workers=12, timeout=30,
+                 resume=False, frontier=None, recrawl=False, sitemap_since=None):
+        # self.pool and self.drivers are the render workers
+        Crawler.__init__(self, seed_urls, render_workers, resume, frontier, sitemap_since, recrawl=recrawl)
+        self.concurrency = concurrency  # fetches in flight
+        self.per_host = per_host  # open connections per host
+        self.timeout = timeout
+        self.persist = ThreadPoolExecutor(max_workers=persist_workers)  # asset downloads and writer queue
+        self.fetcher = Fetcher(persist_workers)  # connections for asset downloads
+        self.blobs = BlobCache(self.fetcher)
+        self.robots_pending = dict()  # robots.txt fetches in flight, one per site
+
+    def run_crawler(self, idle=60):
+        asyncio.get_event_loop().run_until_complete(self.crawl(idle))
+
+    async def crawl(self, idle):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        # trust_env: HTTP_PROXY is honoured like in requests
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, trust_env=True) as http:
+            self.http = http
+            await self.schedule(idle)
+
+        self.pool.shutdown()
+        self.persist.shutdown()
+        self.drivers.close()
+        self.writer.close()  # write remaining results
+        self.frontier.close()
+        database.dispose()
+        print('DRIVERS: ', self.drivers.stats())
+        print('WRITTEN: ', self.writer.written)
+        print('METRICS: ', metrics.snapshot())
+
+    async def schedule(self, idle):
+        loop = asyncio.get_event_loop()
+        slots = asyncio.Semaphore(self.concurrency)
+        tasks = set()
+        idle_since = time.time()
+
+        while True:
+            await slots.acquire()  # take URLs from frontier only for a free slot
+            try:
+                url = self.frontier.get(timeout=0)  # URL of a host that is ready now
+            except Empty:
+                slots.release()
+                if tasks:
+                    idle_since = time.time()
+                elif time.time() - idle_since > idle:  # if queue is empty for idle seconds stop crawling
+                    return
+
+                wait = self.frontier.ready_in()
+                await asyncio.sleep(1 if wait is None else min(max(wait, 0.01), 1))
+                continue
+
+            # a Bloom hit is confirmed with a query on the page table, in a thread instead of on the loop
+            if await loop.run_in_executor(None, self.scraped_pages.__contains__, url):
+                slots.release()
+                continue
+
+            self.scraped_pages.add(url)
+            task = asyncio.ensure_future(self.crawl_page(url))
+            tasks.add(task)
+            task.add_done_callback(lambda t: (tasks.discard(t), slots.release()))
+
+    async def crawl_page(self, url):
+        loop = asyncio.get_event_loop()
+        root_url, domain = self.site_domain(url)
+
+        try:
+            robots = await self.fetch_robots(root_url, domain)
+            cdelay = robots.agent('*').delay
+            self.frontier.set_delay(root_url, 6 if cdelay is None else int(cdelay))  # politeness
+
+            metrics.milestone('first_fetch')
+            with metrics.timer('fetch'):
+                async with self.http.get(url, headers=self.conditional_headers(url)) as response:
+                    if response.status == 304:  # unchanged since last crawl, only the visit is recorded
+                        await loop.run_in_executor(self.persist, self.not_modified, url, response.status)
+                        return
+                    html = await self.read_html(response)  # None if not HTML or too large
+                    if html is None:
+                        metrics.count('not_html')
+                        print('PROBLEM: ', url)
+                        return
+                    status_code = response.status
+                    final_url = str(response.url)
+                    validators = (response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+            with metrics.timer('parse'):
+                doc, links, images = self.fetcher.parse(html, final_url)
+                render = self.fetcher.needs_render(html, doc)
+            if render:  # content is built by JS, render in browser
+                html, links, images = await loop.run_in_executor(self.pool, self.render_page, url)
+            metrics.page(root_url)
+
+            with metrics.timer('extract'):  # sitemaps of a new site, assets and writer queue, off the loop
+                await loop.run_in_executor(self.persist, self.extract_links_images, url, html, status_code, links,
+                                           images, robots, validators)
+        except Exception as e:
+            metrics.error('crawl', e)
+            print('PROBLEM: ', url)
+
+    async def read_html(self, response, chunk_size=64 * 1024):  # same checks as Fetcher.fetch, before the body
+        if 'html' not in response.headers.get('Content-Type', 'text/html') or \
+                response.content_length is not None and response.content_length >= self.fetcher.max_page:
+            return None
+        data = bytearray()
+        async for chunk in response.content.iter_chunked(chunk_size):
+            data += chunk
+            if len(data) >= self.fetcher.max_page:  # missing or wrong Content-Length, abort at the cap
+                return None
+        return self.fetcher.decode(bytes(data), response.charset)
+
+    async def fetch_robots(self, root_url, domain):  # concurrent first hits on a site share one fetch
+        robots = self.robots.cached(domain)  # raises RobotsUnavailable for a recent failure
+        if robots is not None:
+            return robots
+
+        task = self.robots_pending.get(domain)
+        if task is None:
+            task = self.robots_pending[domain] = asyncio.ensure_future(self.get_robots(root_url, domain))
+        try:
+            await task
+        finally:
+            self.robots_pending.pop(domain, None)
+        return self.robots.cached(domain)
+
+    async def get_robots(self, root_url, domain):
+        url = root_url + '/robots.txt'
+        try:
+            with metrics.timer('robots'):
+                async with self.http.get(url) as response:
+                    content = await response.text()
+                    self.robots.store(domain, url, response.status, content)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            metrics.error('robots', e)
+            self.robots.failed(domain, e)
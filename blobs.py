@@ -0,0 +1,73 @@
+import hashlib
+import threading
+from cachetools import LRUCache
+from sqlalchemy.exc import IntegrityError
+from models import Blob
+import database
+
+
+def digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+# content addressed downloads, images and files are keyed by sha256 so each content is stored once,
+# validators of downloaded URLs are kept so unchanged content is not downloaded again, the content is written to
+# the blob table right after the download, only the sha256 travels on to the writer
+class BlobCache:
+
+    def __init__(self, fetcher, max_urls=100000):
+        self.fetcher = fetcher
+        self.validators = LRUCache(maxsize=max_urls)  # url -> (sha256, ETag, Last-Modified)
+        self.stored = LRUCache(maxsize=max_urls)  # sha256 of content known to be in the blob table
+        self.lock = threading.Lock()
+
+        self.downloads = 0  # metrics
+        self.not_modified = 0
+
+    def download(self, url, max_size=10000000):  # sha256 of the stored content, None if failed or too large
+        with self.lock:
+            known = self.validators.get(url)
+
+        headers = dict()
+        if known is not None:
+            hashed, etag, modified = known
+            if etag:
+                headers['If-None-Match'] = etag
+            if modified:
+                headers['If-Modified-Since'] = modified
+
+        response, data = self.fetcher.stream(url, headers=headers, max_size=max_size)
+        if response is None:
+            return None
+        if response.status_code == 304 and known is not None:
+            with self.lock:
+                self.not_modified += 1
+            return known[0]
+        if data is None:  # failed or too large
+            return None
+
+        hashed = digest(data)
+        self.store(hashed, data)
+        etag = response.headers.get('ETag')
+        modified = response.headers.get('Last-Modified')
+        with self.lock:
+            self.downloads += 1
+            if etag or modified:
+                self.validators[url] = (hashed, etag, modified)
+        return hashed
+
+    def store(self, hashed, data):  # once per sha256, content is not held until the writer's next batch
+        with self.lock:
+            if hashed in self.stored:
+                return
+        session = database.create_session()
+        try:
+            if session.query(Blob.hash).filter(Blob.hash == hashed).first() is None:
+                session.add(Blob(hash=hashed, size=len(data), data=data))
+                session.commit()
+        except IntegrityError:  # stored meanwhile by another worker
+            session.rollback()
+        finally:
+            session.close()
+        with self.lock:
+            self.stored[hashed] = True
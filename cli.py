@@ -0,0 +1,107 @@
+import argparse
+import datetime
+import sys
+import metrics
+from config import settings
+
+# entry point of the crawler, heavy modules (Selenium, reppy, lxml, aiohttp) are imported by the command that
+# needs them, so reset and export start in a fraction of a second and a crawl reaches its first fetch sooner
+#
+# python cli.py crawl [--async] [--priority] [--recrawl] [--since DATE] [--node NAME] [--profile] [--workers N]
+#                     [--seeds URL ...]
+# python cli.py resume [same options]
+# python cli.py reset --yes
+# python cli.py export data/crawl.gexf
+
+
+def crawl(args, resume=False):
+    metrics.start(path=settings['metrics_path'], port=settings['metrics_port'])  # curl localhost:8008 while crawling
+    if args.profile:  # sampling profiler, top functions in the metrics
+        metrics.profile()
+
+    frontier = None
+    if args.node:  # one of several processes sharing the crawl
+        from cluster import SharedFrontier, backfill_slots
+        backfill_slots()
+        frontier = SharedFrontier(args.node)
+        frontier.start()
+
+    seeds = args.seeds or settings['seeds']
+    if args.use_async:  # asyncio engine
+        from async_crawler import AsyncCrawler
+        metrics.milestone('imports')
+        crawler = AsyncCrawler(seeds, 1000, render_workers=4, resume=resume, frontier=frontier,
+                               recrawl=args.recrawl, sitemap_since=args.since)  # concurrent fetches, browsers
+    else:
+        from crawler import Crawler
+        metrics.milestone('imports')
+        crawler = Crawler(seeds, args.workers or settings['workers'], resume, frontier, args.since,
+                          recrawl=args.recrawl, priority=args.priority)
+    crawler.run_crawler()
+
+
+def reset(args):
+    if not args.yes:
+        print('PROBLEM: ', 'reset deletes all crawled pages, run with --yes')
+        return 1
+    import database
+    database.delete_all()
+    print('RESET: ', settings['database_uri'].split('@')[-1])
+
+
+def export(args):
+    import graph
+    if args.path.endswith('.gexf'):
+        graph.export_gexf(args.path)
+    else:
+        graph.export_edges(args.path)
+    print('EXPORTED: ', args.path)
+
+
+def date(text):
+    return datetime.datetime.strptime(text, '%Y-%m-%d').date()
+
+
+def parser():
+    main_parser = argparse.ArgumentParser(description='Crawler of .gov.si sites')
+    commands = main_parser.add_subparsers(dest='command')
+    commands.required = True
+
+    for name, help_text in [('crawl', 'crawl from the seeds'), ('resume', 'continue from the FRONTIER pages in DB')]:
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('--async', dest='use_async', action='store_true', help='asyncio engine')
+        command.add_argument('--priority', action='store_true', help='pages with most link weight first')
+        command.add_argument('--recrawl', action='store_true', help='re-crawl pages due for a visit')
+        command.add_argument('--since', type=date, help='skip sitemap URLs not modified since YYYY-MM-DD '
+                                                       '(default on --recrawl: day of the last crawl)')
+        command.add_argument('--node', help='name of this process in a distributed crawl')
+        command.add_argument('--profile', action='store_true', help='sampling profiler in the metrics')
+        command.add_argument('--workers', type=int)
+        command.add_argument('--seeds', nargs='+', help='instead of the seeds in the config')
+
+    command = commands.add_parser('reset', help='delete all crawled pages')
+    command.add_argument('--yes', action='store_true')
+
+    command = commands.add_parser('export', help='pages and links as GEXF (.gexf) or an edge list')
+    command.add_argument('path')
+    return main_parser
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    import database
+    database.get_engine()  # schema check and migrations, once per process
+    metrics.milestone('schema')
+
+    if args.command == 'crawl':
+        return crawl(args)
+    if args.command == 'resume':
+        return crawl(args, resume=True)
+    if args.command == 'reset':
+        return reset(args)
+    return export(args)
+
+
+# MAIN
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import bisect
+import datetime
+import heapq
+import threading
+import zlib
+from sqlalchemy import select, or_
+from frontier import HostFrontier, host_of
+from models import Page, Node
+import database
+
+SLOTS = 1024  # hosts are hashed into slots, slots are split between nodes
+page_table = Page.__table__
+node_table = Node.__table__
+
+
+def host_slot(url):  # same for every node, stored with each page
+    return zlib.crc32(host_of(url).encode('utf-8')) % SLOTS
+
+
+# consistent hashing of slots to nodes, a node joining or leaving only moves the slots next to it on the ring
+class HashRing:
+
+    def __init__(self, nodes, replicas=64):
+        self.ring = sorted((zlib.crc32('{}#{}'.format(node, i).encode('utf-8')), node)
+                           for node in nodes for i in range(replicas))
+        self.keys = [key for key, node in self.ring]
+
+    def node(self, slot):
+        if not self.ring:
+            return None
+        i = bisect.bisect(self.keys, zlib.crc32(str(slot).encode('utf-8'))) % len(self.ring)
+        return self.ring[i][1]
+
+    def slots(self, node):
+        return [slot for slot in range(SLOTS) if self.node(slot) == node]
+
+
+# frontier of one node of a distributed crawl, the page table is the shared frontier: FRONTIER pages of the
+# hosts owned by this node are claimed with SELECT ... FOR UPDATE SKIP LOCKED and crawled from the local
+# per-host queues, so politeness holds because each host is crawled by a single node
+class SharedFrontier(HostFrontier):
+
+    def __init__(self, name, lease=60, interval=5, batch_size=200, default_delay=6):
+        HostFrontier.__init__(self, default_delay)
+        self.name = name  # unique per node
+        self.lease = lease  # seconds without heartbeat after which a node is dead and its pages are reclaimed
+        self.interval = interval  # seconds between heartbeats and claims
+        self.batch_size = batch_size  # pages claimed at once, kept small so other nodes can take over quickly
+        self.owned = set()  # slots of this node
+        self.claimed = 0
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        session = database.create_session()
+        try:  # claims of a previous run under this name, e.g. before a crash, the local queues are still empty
+            session.execute(page_table.update().where(page_table.c.claimed_by == self.name)
+                            .where(page_table.c.page_type_code == 'FRONTIER').values(claimed_by=None))
+            session.commit()
+            self.heartbeat(session)
+        finally:
+            session.close()
+        self.thread.start()
+
+    def close(self):
+        self.stop.set()
+        self.thread.join()
+        session = database.create_session()
+        try:  # leave the ring, remaining claims are released for the other nodes
+            session.execute(node_table.delete().where(node_table.c.name == self.name))
+            session.execute(page_table.update().where(page_table.c.claimed_by == self.name)
+                            .where(page_table.c.page_type_code == 'FRONTIER').values(claimed_by=None))
+            session.commit()
+        finally:
+            session.close()
+
+    def put(self, url, front=False):  # found URLs of other nodes reach them through FRONTIER pages in DB
+        if host_slot(url) in self.owned:
+            HostFrontier.put(self, url, front)
+
+    def requeue(self, url, front=False):  # deferred or retried URL was claimed by this node, kept even if not owned
+        HostFrontier.put(self, url, front)
+
+    def run(self):
+        while not self.stop.wait(self.interval):
+            session = database.create_session()
+            try:
+                live = self.heartbeat(session)
+                if len(self) < self.batch_size:
+                    self.claim(session, live)
+            except Exception as e:
+                session.rollback()
+                print('PROBLEM: ', e)
+            finally:
+                session.close()
+
+    def heartbeat(self, session):  # returns names of live nodes
+        now = datetime.datetime.now()
+        updated = session.execute(node_table.update().where(node_table.c.name == self.name)
+                                  .values(heartbeat=now)).rowcount
+        if not updated:
+            session.execute(node_table.insert().values(name=self.name, heartbeat=now))
+        session.commit()
+
+        alive = now - datetime.timedelta(seconds=self.lease)
+        live = [name for (name,) in session.execute(select([node_table.c.name])
+                                                    .where(node_table.c.heartbeat >= alive))]
+        owned = set(HashRing(live).slots(self.name))
+        lost = self.owned - owned
+        self.owned = owned
+        if lost:
+            self.release(session, lost)
+        return live
+
+    def release(self, session, slots):  # slots moved to another node, their URLs are crawled there
+        with self.cond:
+            for host in [host for host in self.queues if host_slot(host) in slots]:
+                self.size -= len(self.queues.pop(host))
+            self.ready = [(ready_time, host) for ready_time, host in self.ready if host in self.queues]
+            heapq.heapify(self.ready)
+            self.delayed = [(ready_time, url) for ready_time, url in self.delayed if host_slot(url) not in slots]
+            heapq.heapify(self.delayed)
+        session.execute(page_table.update().where(page_table.c.claimed_by == self.name)
+                        .where(page_table.c.page_type_code == 'FRONTIER')
+                        .where(page_table.c.host_slot.in_(sorted(slots))).values(claimed_by=None))
+        session.commit()
+
+    def claim(self, session, live):  # FRONTIER pages of owned slots, unclaimed or claimed by dead nodes
+        if not self.owned:
+            return
+        ids = select([page_table.c.id]) \
+            .where(page_table.c.page_type_code == 'FRONTIER') \
+            .where(page_table.c.host_slot.in_(sorted(self.owned))) \
+            .where(or_(page_table.c.claimed_by.is_(None), page_table.c.claimed_by.notin_(live))) \
+            .order_by(page_table.c.id).limit(self.batch_size) \
+            .with_for_update(skip_locked=True)  # SQLite has no row locks, its writes are serialized anyway
+        ids = [page_id for (page_id,) in session.execute(ids)]
+        if not ids:
+            session.commit()
+            return
+
+        session.execute(page_table.update().where(page_table.c.id.in_(ids)).values(claimed_by=self.name))
+        urls = [url for (url,) in session.execute(select([page_table.c.url]).where(page_table.c.id.in_(ids))
+                                                  .order_by(page_table.c.id))]
+        session.commit()
+
+        for url in urls:
+            HostFrontier.put(self, url)
+        self.claimed += len(urls)
+
+
+def backfill_slots(batch_size=10000):  # pages stored before host slots existed
+    session = database.create_session()
+    try:
+        while True:
+            rows = session.execute(select([page_table.c.id, page_table.c.url])
+                                   .where(page_table.c.host_slot.is_(None)).limit(batch_size)).fetchall()
+            if not rows:
+                return
+            for page_id, url in rows:
+                session.execute(page_table.update().where(page_table.c.id == page_id)
+                                .values(host_slot=host_slot(url)))
+            session.commit()
+    finally:
+        session.close()
@@ -0,0 +1,113 @@
+import os
+import zlib
+from collections import Counter
+
+try:
+    import zstandard
+except ImportError:  # optional, pages are stored with zlib without it
+    zstandard = None
+
+ZLIB = b'z'
+ZSTD = b's'
+DICTIONARY = os.environ.get('CRAWLDB_HTML_DICT', 'data/html.dict')  # shared dictionary trained on gov pages
+ZLIB_WINDOW = 32 * 1024  # zlib only uses the last 32KB of a dictionary
+
+
+def load_dictionary(path=DICTIONARY):
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def archive_path(dict_id, path=DICTIONARY):  # copy of an earlier dictionary, pages compressed with it need it
+    root, ext = os.path.splitext(path)
+    return '{}-{:08x}{}'.format(root, dict_id, ext)
+
+
+def train_dictionary(samples, size=112640):  # samples: HTML of typical pages, as str
+    samples = [sample.encode('utf-8') for sample in samples]
+    if zstandard is not None:
+        return zstandard.train_dictionary(size, samples).as_bytes()
+    # without zstd: most common lines (menus, headers, footers) with the most common ones last, closest to the data
+    lines = Counter(line.strip() for sample in samples for line in sample.splitlines() if len(line.strip()) > 8)
+    dictionary = b''
+    for line, count in lines.most_common():
+        if count < 2 or len(dictionary) + len(line) + 1 > ZLIB_WINDOW:
+            break
+        dictionary = line + b'\n' + dictionary
+    return dictionary
+
+
+# HTML is stored compressed: codec byte, crc32 of the dictionary (0 without one), compressed data; the header makes
+# stored pages readable whatever the codec and dictionary of the current process
+class HtmlCodec:
+
+    def __init__(self, dictionary=None, level=None):
+        self.dictionary = dictionary or None
+        self.dict_id = zlib.crc32(self.dictionary) if self.dictionary else 0
+        self.level = level
+        if zstandard is not None:
+            zdict = zstandard.ZstdCompressionDict(self.dictionary) if self.dictionary else None
+            self.zstd_dict = zdict
+            self.zstd_level = level or 9
+
+    def header(self, codec):
+        return codec + self.dict_id.to_bytes(4, 'little')
+
+    def compress(self, html):
+        if html is None:
+            return None
+        data = html.encode('utf-8')
+        if zstandard is not None:  # compressor objects are not thread safe, one per call is cheap
+            compressor = zstandard.ZstdCompressor(level=self.zstd_level, dict_data=self.zstd_dict)
+            return self.header(ZSTD) + compressor.compress(data)
+        if self.dictionary:
+            compressor = zlib.compressobj(self.level or 6, zdict=self.dictionary[-ZLIB_WINDOW:])
+        else:
+            compressor = zlib.compressobj(self.level or 6)
+        return self.header(ZLIB) + compressor.compress(data) + compressor.flush()
+
+    def decompress(self, data):
+        if data is None:
+            return None
+        data = bytes(data)
+        codec, dict_id, payload = data[:1], int.from_bytes(data[1:5], 'little'), data[5:]
+        if dict_id and dict_id != self.dict_id:  # trained before the current dictionary
+            return archived_codec(dict_id).decompress(data)
+
+        if codec == ZSTD:
+            if zstandard is None:
+                raise ValueError('page compressed with zstd, zstandard is not installed')
+            decompressor = zstandard.ZstdDecompressor(dict_data=self.zstd_dict if dict_id else None)
+            return decompressor.decompress(payload).decode('utf-8')
+        if codec == ZLIB:
+            if dict_id:
+                decompressor = zlib.decompressobj(zdict=self.dictionary[-ZLIB_WINDOW:])
+            else:
+                decompressor = zlib.decompressobj()
+            return (decompressor.decompress(payload) + decompressor.flush()).decode('utf-8')
+        raise ValueError('unknown codec {!r}'.format(codec))
+
+
+codec = HtmlCodec(load_dictionary())  # one per process
+archived = dict()  # dict_id -> codec of an earlier dictionary
+
+
+def archived_codec(dict_id):
+    other = archived.get(dict_id)
+    if other is None:
+        dictionary = load_dictionary(archive_path(dict_id))
+        if dictionary is None or zlib.crc32(dictionary) != dict_id:
+            raise ValueError('page compressed with another dictionary ({:08x})'.format(dict_id))
+        other = archived[dict_id] = HtmlCodec(dictionary)
+    return other
+
+
+def compress(html):
+    return codec.compress(html)
+
+
+def decompress(data):
+    return codec.decompress(data)
@@ -0,0 +1,32 @@
+import json
+import os
+
+# settings of a crawl: defaults, overridden by the JSON file in CRAWLER_CONFIG (crawler.json), overridden by env
+CONFIG = os.environ.get('CRAWLER_CONFIG', 'crawler.json')
+DEFAULTS = {
+    'seeds': ['https://e-uprava.gov.si', 'https://podatki.gov.si', 'http://www.e-prostor.gov.si', 'http://evem.gov.si'],
+    'workers': 12,
+    'metrics_path': 'data/metrics.json',
+    'metrics_port': 8008
+}
+ENV = {'database_uri': 'CRAWLDB_URI', 'seeds': 'CRAWLER_SEEDS', 'workers': 'CRAWLER_WORKERS'}
+
+
+def load(path=CONFIG):
+    settings = dict(DEFAULTS)
+    if os.path.exists(path):
+        with open(path) as f:
+            settings.update(json.load(f))
+
+    for key, name in ENV.items():
+        value = os.environ.get(name)
+        if value:
+            if key == 'seeds':  # comma separated
+                value = [seed.strip() for seed in value.split(',') if seed.strip()]
+            elif key == 'workers':
+                value = int(value)
+            settings[key] = value
+    return settings
+
+
+settings = load()
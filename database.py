@@ -0,0 +1,57 @@
+import threading
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from models import DATABASE_URI, create_schema, Site, Page, Image, PageData, Link, Blob
+
+lock = threading.Lock()
+engine = None
+session_factory = sessionmaker()
+
+
+def get_engine():  # one engine and connection pool per process, instead of one per page
+    global engine
+    with lock:
+        if engine is None:
+            if not DATABASE_URI:  # no default, credentials belong in crawler.json or the environment
+                raise SystemExit('PROBLEM: database_uri is not set, in crawler.json (see crawler.example.json) '
+                                 'or CRAWLDB_URI')
+            if DATABASE_URI.startswith('sqlite'):
+                engine = create_sqlite_engine(DATABASE_URI)
+            else:
+                engine = create_engine(DATABASE_URI, pool_size=5, max_overflow=10, pool_pre_ping=True)
+            session_factory.configure(bind=engine)
+            create_schema(engine)  # schema setup once per process
+    return engine
+
+
+def create_sqlite_engine(uri):  # local stand-in for Postgres, the file is attached as the crawldb schema
+    engine = create_engine(uri, connect_args={'timeout': 60, 'check_same_thread': False})
+
+    @event.listens_for(engine, 'connect')
+    def attach(connection, record):
+        connection.execute("ATTACH DATABASE '{}' AS crawldb".format(engine.url.database))
+
+    return engine
+
+
+def create_session():
+    get_engine()
+    return session_factory()
+
+
+def dispose():
+    global engine
+    with lock:
+        if engine is not None:
+            engine.dispose()
+            engine = None
+
+
+def delete_all():  # empty crawl, lookup tables and schema stay
+    session = create_session()
+    try:
+        for table in [Image, Link, PageData, Page, Site, Blob]:
+            session.query(table).delete()
+        session.commit()
+    finally:
+        session.close()
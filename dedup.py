@@ -0,0 +1,47 @@
+import threading
+from models import Page
+
+
+# exact duplicate detection, replaces loading every page row and scanning a list of hashes
+class HashIndex:
+
+    def __init__(self):
+        self.keys = set()  # 64-bit prefixes of stored md5 hashes, fixed width and O(1) lookup
+        self.lock = threading.Lock()  # check and add must be atomic between workers
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, hashed):
+        return self.key(hashed) in self.keys
+
+    @staticmethod
+    def key(hashed):
+        return int(hashed.strip()[:16], 16)
+
+    def warm(self, session, batch_size=10000):  # load hashes of already stored pages at startup
+        rows = session.query(Page.hash).filter(Page.hash.isnot(None)).yield_per(batch_size)
+        with self.lock:
+            for (hashed,) in rows:
+                try:
+                    self.keys.add(self.key(hashed))
+                except ValueError:  # raw digest stored by older versions, not comparable with hex hashes
+                    continue
+
+    def add(self, hashed):  # False if hash was already known
+        key = self.key(hashed)
+        with self.lock:
+            if key in self.keys:
+                return False
+            self.keys.add(key)
+            return True
+
+    def clear(self):
+        with self.lock:
+            self.keys.clear()
+
+    def is_duplicate(self, hashed, session, url):  # called when add() found the prefix
+        # prefix matched, confirm with a single lookup on the unique hash index (prefix collision or page
+        # still being written by another worker, in that case the unique index rejects the second insert),
+        # the stored row of a re-crawled page is not its duplicate
+        return session.query(Page.id).filter(Page.hash == hashed).filter(Page.url != url).first() is not None
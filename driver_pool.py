@@ -0,0 +1,137 @@
+import threading
+import time
+from queue import Queue, Empty
+from selenium.common.exceptions import WebDriverException
+
+
+def create_driver(page_load_timeout=30):
+    from selenium import webdriver  # imported with the first browser, most pages need none
+
+    options = webdriver.ChromeOptions()
+    options.add_argument("headless")
+    options.add_experimental_option("prefs", {"profile.default_content_settings.cookies": 2})  # disable cookies
+    driver = webdriver.Chrome(options=options)
+    driver.set_page_load_timeout(page_load_timeout)  # seconds, like plain fetches, a slow host is a HostFailure
+    return driver
+
+
+# bounded pool of reusable browsers, starting Chrome is the most expensive part of scraping a page
+class DriverPool:
+
+    def __init__(self, size, max_pages=200, max_memory=512 * 1024 * 1024, factory=create_driver):
+        self.size = size  # at most one driver per worker
+        self.max_pages = max_pages  # recycle driver after this many pages
+        self.max_memory = max_memory  # recycle driver when its JS heap grows over this many bytes
+        self.factory = factory
+        self.idle = Queue()  # drivers waiting for checkout, created lazily
+        self.pages = dict()  # number of pages loaded by each driver
+        self.created = 0
+        self.lock = threading.Lock()
+
+        self.checkouts = 0  # metrics
+        self.reuses = 0
+        self.wait_time = 0.0
+        self.recycled = 0
+        self.replaced = 0
+
+    def checkout(self, timeout=None):
+        start = time.time()
+        driver = self.acquire(timeout)
+        reused = driver in self.pages
+
+        if reused and not self.healthy(driver):  # browser crashed while idle, replace it
+            self.retire(driver)
+            driver = self.new_driver()
+            reused = False
+            with self.lock:
+                self.replaced += 1
+
+        with self.lock:
+            self.checkouts += 1
+            self.reuses += reused
+            self.wait_time += time.time() - start
+            self.pages.setdefault(driver, 0)
+
+        return driver
+
+    def checkin(self, driver, broken=False):
+        with self.lock:
+            self.pages[driver] = self.pages.get(driver, 0) + 1
+            worn = self.pages[driver] >= self.max_pages
+
+        if broken or worn or self.memory(driver) > self.max_memory:
+            self.retire(driver)
+            with self.lock:
+                self.recycled += not broken
+                self.replaced += broken
+        else:
+            self.idle.put(driver)
+
+    def acquire(self, timeout):
+        try:
+            return self.idle.get_nowait()
+        except Empty:
+            pass
+
+        with self.lock:
+            create = self.created < self.size
+            if create:
+                self.created += 1
+
+        if create:
+            return self.new_driver(counted=True)
+        return self.idle.get(timeout=timeout)  # pool exhausted, wait for a checkin (raises Empty)
+
+    def new_driver(self, counted=False):
+        if not counted:
+            with self.lock:
+                self.created += 1
+        try:
+            return self.factory()
+        except:
+            with self.lock:
+                self.created -= 1
+            raise
+
+    def retire(self, driver):
+        with self.lock:
+            self.pages.pop(driver, None)
+            self.created -= 1
+        try:
+            driver.quit()
+        except WebDriverException:  # already dead
+            pass
+
+    def healthy(self, driver):
+        try:
+            driver.current_url  # round trip to the browser
+            return True
+        except WebDriverException:
+            return False
+
+    def memory(self, driver):
+        try:
+            used = driver.execute_script('return window.performance.memory ? '
+                                         'window.performance.memory.usedJSHeapSize : 0;')
+            return used or 0
+        except WebDriverException:
+            return self.max_memory + 1  # unresponsive, recycle
+
+    def stats(self):
+        with self.lock:
+            checkouts = max(self.checkouts, 1)
+            return {
+                'drivers': self.created,
+                'checkouts': self.checkouts,
+                'reuse_rate': self.reuses / checkouts,
+                'avg_wait': self.wait_time / checkouts,
+                'recycled': self.recycled,
+                'replaced': self.replaced
+            }
+
+    def close(self):
+        while True:
+            try:
+                self.retire(self.idle.get_nowait())
+            except Empty:
+                return
@@ -0,0 +1,91 @@
+import requests
+from requests.adapters import HTTPAdapter
+from lxml import html as lxml_html
+from lxml.etree import ParserError
+
+# markup of client side rendered pages, these need a browser to get the content and links
+SPA_MARKERS = ['ng-app', 'ng-version', 'data-reactroot', 'data-react-helmet', '__NEXT_DATA__', '__NUXT__',
+               'id="app"', 'id="root"', 'ember-application', 'data-server-rendered']
+
+
+# plain HTTP fetch over pooled connections, Selenium is only needed for pages that look JS dependent
+class Fetcher:
+
+    def __init__(self, pool_size=12, timeout=30, min_text=300, markers=SPA_MARKERS, max_page=5000000):
+        self.timeout = timeout
+        self.max_page = max_page  # bytes, larger pages are not downloaded
+        self.min_text = min_text  # less visible text than this means page is probably built by JS
+        self.markers = markers
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=100, pool_maxsize=pool_size)  # keep-alive connections per host
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def fetch(self, url, headers=None, chunk_size=64 * 1024):  # (response, HTML), HTML is None if not HTML or too large
+        with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+            length = response.headers.get('Content-Length')
+            if not self.is_html(response) or length is not None and length.isdigit() and int(length) >= self.max_page:
+                return response, None  # decided on the headers, body is not downloaded
+
+            data = bytearray()
+            for chunk in response.iter_content(chunk_size):
+                data += chunk
+                if len(data) >= self.max_page:  # missing or wrong Content-Length, abort at the cap
+                    return response, None
+            return response, self.decode(bytes(data), response.encoding)
+
+    @staticmethod
+    def decode(data, encoding):  # charset of the Content-Type, UTF-8 without it
+        try:
+            return data.decode(encoding or 'utf-8', errors='replace')
+        except LookupError:  # unknown charset
+            return data.decode('utf-8', errors='replace')
+
+    def download(self, url, max_size=10000000):  # raw bytes, None if too large or failed
+        response, data = self.stream(url, max_size=max_size)
+        if response is None or response.status_code != 200:
+            return None
+        return data
+
+    def stream(self, url, headers=None, max_size=10000000, chunk_size=64 * 1024):  # body is None if over max_size
+        try:
+            with self.session.get(url, headers=headers, timeout=self.timeout, stream=True) as response:
+                if response.status_code != 200:
+                    return response, None
+                length = response.headers.get('Content-Length')
+                if length is not None and length.isdigit() and int(length) >= max_size:
+                    return response, None  # too large, skipped before the body is downloaded
+
+                data = bytearray()
+                for chunk in response.iter_content(chunk_size):
+                    data += chunk
+                    if len(data) >= max_size:  # missing or wrong Content-Length, abort at the cap
+                        return response, None
+                return response, bytes(data)
+        except requests.RequestException:
+            return None, None
+
+    def is_html(self, response):
+        return 'html' in response.headers.get('Content-Type', 'text/html')
+
+    def parse(self, html, base_url):  # links and image sources, resolved against page URL
+        try:  # lxml refuses strings with an XML encoding declaration, parse decoded text as UTF-8 bytes
+            doc = lxml_html.fromstring(html.encode('utf-8'), parser=lxml_html.HTMLParser(encoding='utf-8'))
+        except ParserError:  # empty document
+            return None, list(), list()
+
+        doc.make_links_absolute(base_url, resolve_base_href=True)
+        links = doc.xpath('//a/@href')
+        images = doc.xpath('//img/@src')
+        return doc, links, images
+
+    def needs_render(self, html, doc):
+        if doc is None:
+            return True
+        if any(marker in html for marker in self.markers):
+            return True
+
+        for element in doc.xpath('//script|//style|//noscript'):
+            element.drop_tree()
+        text = ' '.join(doc.text_content().split())
+        return len(text) < self.min_text
@@ -0,0 +1,152 @@
+import heapq
+import threading
+import time
+from collections import deque
+from queue import Empty
+from urllib.parse import urlparse
+
+
+def host_of(url):  # same key as Crawler.robots
+    return '{}://{}'.format(urlparse(url).scheme, urlparse(url).netloc)
+
+
+# frontier with one FIFO queue per host and a heap of hosts ordered by the time they may be fetched again,
+# get() always returns a URL of the host that is ready soonest, so crawl delays are kept without idling
+class HostFrontier:
+
+    def __init__(self, default_delay=6):
+        self.default_delay = default_delay  # used until robots.txt of the host is known
+        self.queues = dict()  # URLs waiting for each host, BFS order within a host
+        self.delays = dict()  # crawl delay of each host in seconds
+        self.next_fetch = dict()  # earliest time the next URL of a host may be fetched
+        self.ready = list()  # heap of (ready time, host), one entry per host with waiting URLs
+        self.delayed = list()  # heap of (ready time, url), URLs put back later on their own, e.g. retries
+        self.size = 0
+        self.cond = threading.Condition()
+
+    def __len__(self):
+        return self.size + len(self.delayed)
+
+    def qsize(self):
+        return len(self)
+
+    def empty(self):
+        return len(self) == 0
+
+    def put(self, url, front=False):  # front: ahead of the other URLs of the host
+        host = host_of(url)
+        with self.cond:
+            queue = self.queues.get(host)
+            if queue is None:
+                queue = self.queues[host] = deque()
+            if front:
+                queue.appendleft(url)
+            else:
+                queue.append(url)
+            self.size += 1
+
+            if len(queue) == 1:  # host was idle, schedule it
+                heapq.heappush(self.ready, (self.next_fetch.get(host, 0), host))
+                self.cond.notify()
+
+    def get(self, timeout=None):  # raises Empty when no host became ready within timeout
+        deadline = None if timeout is None else time.time() + timeout
+
+        with self.cond:
+            while True:
+                now = time.time()
+                while self.delayed and self.delayed[0][0] <= now:  # delayed URLs are due, back to their host
+                    self.requeue(heapq.heappop(self.delayed)[1])
+                wait = self.delayed[0][0] - now if self.delayed else None
+                if self.ready:
+                    ready_time, host = self.ready[0]
+                    if ready_time < self.next_fetch.get(host, 0):  # host was deferred after it was scheduled
+                        heapq.heapreplace(self.ready, (self.next_fetch[host], host))
+                        continue
+                    if ready_time <= now:
+                        heapq.heappop(self.ready)
+                        return self.pop(host, now)
+                    wait = ready_time - now if wait is None else min(wait, ready_time - now)
+
+                if deadline is not None:
+                    if deadline <= now:
+                        raise Empty
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+                self.cond.wait(wait)
+
+    def pop(self, host, now):
+        queue = self.queues[host]
+        url = queue.popleft()
+        self.size -= 1
+
+        self.next_fetch[host] = now + self.delays.get(host, self.default_delay)
+        if queue:
+            heapq.heappush(self.ready, (self.next_fetch[host], host))
+        else:
+            del self.queues[host]
+        return url
+
+    def ready_in(self):  # seconds until the next host is ready, None if frontier is empty
+        with self.cond:
+            if not self.ready:
+                return None
+            return max(self.ready[0][0] - time.time(), 0)
+
+    def defer(self, url, delay):  # URL back at the front of its host, host not fetched for delay seconds
+        host = host_of(url)
+        with self.cond:
+            self.next_fetch[host] = max(self.next_fetch.get(host, 0), time.time() + delay)
+            self.requeue(url, front=True)
+
+    def put_later(self, url, delay):  # only this URL waits, other URLs of its host go on
+        with self.cond:
+            heapq.heappush(self.delayed, (time.time() + delay, url))
+            self.cond.notify()
+
+    def requeue(self, url, front=False):  # URL taken from this frontier before, see SharedFrontier
+        self.put(url, front)
+
+    def set_delay(self, host, delay):  # crawl delay from robots.txt, applies from the next fetch of the host
+        with self.cond:
+            self.delays[host] = delay
+
+    def close(self):  # nothing to release, see SharedFrontier
+        pass
+
+
+# hosts are still ordered by ready time (politeness), within a host the URL with the highest link score goes first;
+# a URL put again after more in-links found it gets a new entry with the higher score, stale entries are skipped by
+# the crawler like any other seen URL
+class PriorityFrontier(HostFrontier):
+
+    def __init__(self, graph, default_delay=6):
+        HostFrontier.__init__(self, default_delay)
+        self.graph = graph  # LinkGraph, score of each URL
+        self.counter = 0  # FIFO among equal scores
+
+    def put(self, url, front=False):  # front: ahead of scored URLs of the host, e.g. recently modified pages
+        host = host_of(url)
+        score = self.graph.score(url)
+        with self.cond:
+            queue = self.queues.get(host)
+            if queue is None:
+                queue = self.queues[host] = list()
+            self.counter += 1
+            heapq.heappush(queue, (0 if front else 1, -score, self.counter, url))
+            self.size += 1
+
+            if len(queue) == 1:  # host was idle, schedule it
+                heapq.heappush(self.ready, (self.next_fetch.get(host, 0), host))
+                self.cond.notify()
+
+    def pop(self, host, now):
+        queue = self.queues[host]
+        url = heapq.heappop(queue)[3]
+        self.size -= 1
+
+        self.next_fetch[host] = now + self.delays.get(host, self.default_delay)
+        if queue:
+            heapq.heappush(self.ready, (self.next_fetch[host], host))
+        else:
+            del self.queues[host]
+        return url
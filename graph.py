@@ -0,0 +1,214 @@
+import hashlib
+import threading
+from array import array
+from xml.sax.saxutils import quoteattr
+from sqlalchemy import select
+from models import Page, Link
+import database
+
+page_table = Page.__table__
+link_table = Link.__table__
+
+
+def url_node(url):  # 64-bit key of a URL as the crawler queues it
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+# link graph in compact arrays: nodes are dense indexes, out-links in CSR form (offsets and targets), new edges go
+# to a delta log merged into CSR when it grows; in-degree and OPIC cash are updated incrementally while crawling
+class LinkGraph:
+
+    def __init__(self, compact_every=100000):
+        self.nodes = dict()  # url key -> index
+        self.offsets = array('q', [0])  # CSR, out-links of node i are targets[offsets[i]:offsets[i + 1]]
+        self.targets = array('q')
+        self.delta_from = array('q')  # edges added since the last compaction
+        self.delta_to = array('q')
+        self.compact_every = compact_every
+        self.indegree = array('q')
+        self.linked = bytearray()  # 1 if out-links of the node are recorded
+        self.cash = array('d')  # OPIC: cash of a node is split between its out-links when it is crawled
+        self.history = array('d')  # cash received over the crawl, importance estimate of crawled pages
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.indegree)
+
+    def edges(self):
+        return len(self.targets) + len(self.delta_from)
+
+    def node(self, key):  # index of a url key, added if new
+        index = self.nodes.get(key)
+        if index is None:
+            index = self.nodes[key] = len(self.indegree)
+            self.indegree.append(0)
+            self.linked.append(0)
+            self.cash.append(0.0)
+            self.history.append(0.0)
+        return index
+
+    def seed(self, url, cash=1.0):  # seeds start with the cash
+        with self.lock:
+            self.cash[self.node(url_node(url))] += cash
+
+    def add_page(self, url, links):  # out-links of a crawled page, its cash goes to them
+        with self.lock:
+            source = self.node(url_node(url))
+            targets = list()
+            for link in links:
+                target = self.node(url_node(link))
+                if target != source:
+                    targets.append(target)
+            if not self.linked[source]:  # re-crawled pages keep their first edges
+                self.linked[source] = 1
+                for target in targets:
+                    self.add_edge(source, target)
+
+            cash = self.cash[source]
+            self.history[source] += cash
+            self.cash[source] = 0.0
+            if targets:
+                share = cash / len(targets)
+                for target in targets:
+                    self.cash[target] += share
+            if len(self.delta_from) >= max(self.compact_every, len(self.targets)):  # amortized, log grows with CSR
+                self.compact()
+
+    def add_edge(self, source, target):
+        self.delta_from.append(source)
+        self.delta_to.append(target)
+        self.indegree[target] += 1
+
+    def score(self, url):  # crawl priority of a URL, cash of OPIC with in-degree to break ties
+        with self.lock:
+            index = self.nodes.get(url_node(url))
+            if index is None:
+                return 0.0
+            return self.cash[index] + self.indegree[index] * 1e-9
+
+    def compact(self):  # merge the delta log into CSR, node by node with slice copies
+        added = dict()  # source -> new targets
+        for source, target in zip(self.delta_from, self.delta_to):
+            added.setdefault(source, list()).append(target)
+
+        offsets = array('q', [0])
+        targets = array('q')
+        old = len(self.offsets) - 1
+        for i in range(len(self.indegree)):
+            if i < old:
+                targets.extend(self.targets[self.offsets[i]:self.offsets[i + 1]])
+            new = added.get(i)
+            if new is not None:
+                targets.extend(new)
+            offsets.append(len(targets))
+
+        self.offsets = offsets
+        self.targets = targets
+        self.delta_from = array('q')
+        self.delta_to = array('q')
+
+    def out_links(self, index):
+        with self.lock:
+            if index + 1 >= len(self.offsets) or self.delta_from:
+                self.compact()
+            return self.targets[self.offsets[index]:self.offsets[index + 1]]
+
+    def pagerank(self, damping=0.85, iterations=20):  # power iteration over CSR, dangling rank spread evenly
+        with self.lock:
+            self.compact()
+            count = len(self.indegree)
+            offsets, targets = self.offsets, self.targets
+        if not count:
+            return array('d')
+
+        degree = [offsets[i + 1] - offsets[i] for i in range(count)]
+        sources = array('q')  # source of each edge, so an iteration is one pass over the edges
+        for i in range(count):
+            sources.extend([i] * degree[i])
+
+        rank = [1.0 / count] * count
+        for _ in range(iterations):
+            share = [value / out if out else 0.0 for value, out in zip(rank, degree)]
+            dangling = sum(value for value, out in zip(rank, degree) if not out)
+            following = [0.0] * count
+            for source, target in zip(sources, targets):
+                following[target] += share[source]
+            base = (1 - damping) / count + damping * dangling / count
+            rank = [base + damping * value for value in following]
+        return array('d', rank)
+
+    def build(self, batch_size=10000):  # graph of stored pages from Link rows, core queries without the ORM
+        index = dict()  # page id -> node index
+        connection = database.get_engine().connect()
+        try:
+            pages = connection.execution_options(stream_results=True) \
+                .execute(select([page_table.c.id, page_table.c.url]))
+            with self.lock:
+                for rows in iter(lambda: pages.fetchmany(batch_size), []):
+                    for page_id, url in rows:
+                        index[page_id] = self.node(url_node(url))
+
+            links = connection.execution_options(stream_results=True) \
+                .execute(select([link_table.c.from_page, link_table.c.to_page]))
+            with self.lock:
+                for rows in iter(lambda: links.fetchmany(batch_size), []):
+                    for from_page, to_page in rows:
+                        source, target = index.get(from_page), index.get(to_page)
+                        if source is not None and target is not None:
+                            self.linked[source] = 1
+                            self.add_edge(source, target)
+                self.compact()
+        finally:
+            connection.close()
+
+
+def export_edges(path, batch_size=10000):  # "from_page to_page" per line, page ids
+    connection = database.get_engine().connect()
+    try:
+        links = connection.execution_options(stream_results=True) \
+            .execute(select([link_table.c.from_page, link_table.c.to_page]))
+        with open(path, 'w') as out:
+            for rows in iter(lambda: links.fetchmany(batch_size), []):
+                out.write(''.join('{} {}\n'.format(from_page, to_page) for from_page, to_page in rows))
+    finally:
+        connection.close()
+
+
+def export_gexf(path, batch_size=10000):  # pages and links for Gephi, streamed to the file
+    connection = database.get_engine().connect()
+    try:
+        with open(path, 'w', encoding='utf-8') as out:
+            out.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                      '<gexf xmlns="http://www.gexf.net/1.2draft" version="1.2">\n'
+                      '<graph mode="static" defaultedgetype="directed">\n'
+                      '<attributes class="node"><attribute id="0" title="type" type="string"/></attributes>\n'
+                      '<nodes>\n')
+            pages = connection.execution_options(stream_results=True) \
+                .execute(select([page_table.c.id, page_table.c.url, page_table.c.page_type_code]))
+            for rows in iter(lambda: pages.fetchmany(batch_size), []):
+                out.write(''.join('<node id="{}" label={}><attvalues><attvalue for="0" value={}/></attvalues>'
+                                  '</node>\n'.format(page_id, quoteattr(url or ''), quoteattr(page_type or ''))
+                                  for page_id, url, page_type in rows))
+
+            out.write('</nodes>\n<edges>\n')
+            links = connection.execution_options(stream_results=True) \
+                .execute(select([link_table.c.from_page, link_table.c.to_page]))
+            edge = 0
+            for rows in iter(lambda: links.fetchmany(batch_size), []):
+                out.write(''.join('<edge id="{}" source="{}" target="{}"/>\n'.format(edge + i, from_page, to_page)
+                                  for i, (from_page, to_page) in enumerate(rows)))
+                edge += len(rows)
+            out.write('</edges>\n</graph>\n</gexf>\n')
+    finally:
+        connection.close()
+
+
+# MAIN
+if __name__ == '__main__':
+    import sys
+
+    target = sys.argv[1] if len(sys.argv) > 1 else 'data/crawl.gexf'
+    if target.endswith('.gexf'):
+        export_gexf(target)
+    else:
+        export_edges(target)
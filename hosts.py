@@ -0,0 +1,98 @@
+import threading
+import time
+import metrics
+
+
+class HostFailure(Exception):  # fetch failed because of the host (timeout, connection, 5xx), URL is retried later
+    pass
+
+
+class HostState:
+    __slots__ = ['latency', 'errors', 'limit', 'in_flight', 'failures', 'trips', 'open_until']
+
+    def __init__(self, limit):
+        self.latency = 0.0  # seconds, moving average
+        self.errors = 0.0  # error rate, moving average
+        self.limit = limit  # requests in flight allowed, AIMD
+        self.in_flight = 0
+        self.failures = 0  # consecutive
+        self.trips = 0  # circuit openings in a row, backoff doubles with each
+        self.open_until = 0.0  # circuit open until then, half open (one probe) after it, closed when 0
+
+
+# health of each host: in-flight requests adapt AIMD style (one more per round of successes, halved on errors or
+# slow answers), after threshold consecutive failures the circuit opens and the host is not fetched for an
+# exponentially growing backoff, then a single probe request decides whether it closes again
+class HostHealth:
+
+    def __init__(self, start_limit=2, max_limit=8, slow=10.0, threshold=5, backoff=30, max_backoff=3600, alpha=0.2):
+        self.start_limit = start_limit
+        self.max_limit = max_limit
+        self.slow = slow  # seconds, slower answers count as congestion
+        self.threshold = threshold  # consecutive failures that open the circuit
+        self.backoff = backoff  # seconds of the first opening
+        self.max_backoff = max_backoff
+        self.alpha = alpha  # weight of the last request in the moving averages
+        self.hosts = dict()
+        self.lock = threading.Lock()
+
+    def state(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostState(self.start_limit)
+        return state
+
+    def acquire(self, host):  # 0 if a request may start now, else seconds to wait before trying again
+        with self.lock:
+            state = self.state(host)
+            now = time.time()
+            if state.open_until > now:  # open
+                return state.open_until - now
+            if state.open_until and state.in_flight:  # half open, probe in flight
+                return max(state.latency, 1.0)
+            if state.in_flight >= int(state.limit):
+                return max(state.latency, 0.1)  # about when one of the requests in flight finishes
+            state.in_flight += 1
+            return 0
+
+    def release(self, host, latency, ok):
+        with self.lock:
+            state = self.state(host)
+            state.in_flight = max(state.in_flight - 1, 0)
+            state.latency += self.alpha * (latency - state.latency)
+            state.errors += self.alpha * ((0.0 if ok else 1.0) - state.errors)
+
+            if ok:
+                state.failures = 0
+                if state.open_until:  # probe succeeded, close
+                    state.open_until = 0.0
+                    state.trips = 0
+                if latency > self.slow:
+                    state.limit = max(state.limit / 2, 1)
+                else:
+                    state.limit = min(state.limit + 1 / state.limit, self.max_limit)
+                return
+
+            state.failures += 1
+            state.limit = max(state.limit / 2, 1)
+            if state.open_until or state.failures >= self.threshold:  # failed probe or too many failures, open
+                state.trips += 1
+                state.open_until = time.time() + min(self.backoff * 2 ** (state.trips - 1), self.max_backoff)
+                metrics.count('circuit_open')
+
+    def wait(self, host):  # seconds until an open circuit lets requests through
+        with self.lock:
+            state = self.hosts.get(host)
+            return max(state.open_until - time.time(), 0) if state is not None else 0
+
+    def stats(self):
+        with self.lock:
+            now = time.time()
+            slowest = sorted(self.hosts.items(), key=lambda item: -item[1].latency)[:5]
+            return {
+                'hosts': len(self.hosts),
+                'open': sum(1 for state in self.hosts.values() if state.open_until > now),
+                'in_flight': sum(state.in_flight for state in self.hosts.values()),
+                'slowest': {host: {'latency': round(state.latency, 3), 'errors': round(state.errors, 3),
+                                   'limit': round(state.limit, 2)} for host, state in slowest}
+            }
@@ -0,0 +1,179 @@
+import json
+import sys
+import threading
+import time
+import traceback
+from collections import defaultdict, deque, Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# crawl metrics, one set per process: stage timings, counters, pages per host, errors by type and gauges,
+# exposed as a periodic JSON dump and/or a local HTTP endpoint
+
+lock = threading.Lock()
+started = time.time()
+timings = defaultdict(lambda: deque(maxlen=10000))  # last durations of each stage, for percentiles
+totals = defaultdict(lambda: [0, 0.0])  # count and total seconds of each stage
+counters = Counter()
+hosts = Counter()  # crawled pages per host
+errors = Counter()  # (stage, exception type)
+milestones = dict()  # seconds from start of the process to the first time of each event, e.g. first fetch
+gauges = dict()  # name -> function returning current value
+sampler = None
+
+
+@contextmanager
+def timer(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with lock:
+            timings[stage].append(elapsed)
+            total = totals[stage]
+            total[0] += 1
+            total[1] += elapsed
+
+
+def count(name, value=1):
+    with lock:
+        counters[name] += value
+
+
+def page(host):
+    with lock:
+        hosts[host] += 1
+
+
+def error(stage, e):
+    with lock:
+        errors['{}: {}'.format(stage, type(e).__name__)] += 1
+
+
+def milestone(name):  # only the first time counts
+    with lock:
+        if name in milestones:
+            return
+        milestones[name] = time.time() - started
+    print('STARTUP: ', name, '{:.3f}s'.format(milestones[name]))
+
+
+def gauge(name, function):  # e.g. frontier depth, read when a snapshot is taken
+    gauges[name] = function
+
+
+def percentile(values, p):
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+def snapshot():
+    elapsed = time.time() - started
+    with lock:
+        stages = dict()
+        for stage, (calls, seconds) in totals.items():
+            values = sorted(timings[stage])
+            stages[stage] = {
+                'count': calls,
+                'total': seconds,
+                'avg': seconds / calls,
+                'p50': percentile(values, 0.5),
+                'p99': percentile(values, 0.99),
+                'max': values[-1]
+            }
+        result = {
+            'elapsed': elapsed,
+            'pages': sum(hosts.values()),
+            'pages_per_sec': sum(hosts.values()) / elapsed,
+            'hosts': {host: {'pages': pages, 'pages_per_sec': pages / elapsed} for host, pages in hosts.items()},
+            'stages': stages,
+            'counters': dict(counters),
+            'errors': dict(errors),
+            'milestones': dict(milestones)
+        }
+    for name, function in list(gauges.items()):
+        try:
+            result[name] = function()
+        except Exception as e:
+            result[name] = repr(e)
+    if sampler is not None:
+        result['profile'] = sampler.top()
+    return result
+
+
+def dump(path):
+    with open(path, 'w') as f:
+        json.dump(snapshot(), f, indent=2, sort_keys=True)
+
+
+def start(path=None, interval=10, port=None):  # JSON dump every interval seconds and/or HTTP endpoint
+    if path is not None:
+        def run():
+            while True:
+                time.sleep(interval)
+                dump(path)
+        threading.Thread(target=run, daemon=True).start()
+
+    if port is not None:
+        try:
+            server = ThreadingHTTPServer(('localhost', port), Handler)
+        except OSError as e:  # port taken, e.g. by another crawler node
+            print('PROBLEM: ', e)
+            return
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+
+class Handler(BaseHTTPRequestHandler):  # GET / returns the snapshot as JSON
+
+    def do_GET(self):
+        body = json.dumps(snapshot(), sort_keys=True).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # no access log on stdout
+        pass
+
+
+def profile(interval=0.01):  # sampling profiler over all threads, top functions are added to the snapshot
+    global sampler
+    if sampler is None:
+        sampler = Sampler(interval)
+        sampler.start()
+
+
+class Sampler(threading.Thread):
+
+    def __init__(self, interval):
+        threading.Thread.__init__(self, daemon=True)
+        self.interval = interval
+        self.samples = Counter()  # innermost frame of each thread
+        self.stacks = Counter()  # whole stacks, collapsed format for flame graphs
+
+    def run(self):
+        me = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == me:
+                    continue
+                stack = traceback.extract_stack(frame)
+                if not stack:
+                    continue
+                leaf = stack[-1]
+                with lock:
+                    self.samples['{}:{} {}'.format(leaf.filename, leaf.lineno, leaf.name)] += 1
+                    self.stacks[';'.join('{} ({})'.format(f.name, f.filename) for f in stack)] += 1
+
+    def top(self, n=30):
+        with lock:
+            return self.samples.most_common(n)
+
+    def dump(self, path):  # collapsed stacks, input of flamegraph.pl
+        with lock:
+            stacks = list(self.stacks.items())
+        with open(path, 'w') as f:
+            for stack, samples in stacks:
+                f.write('{} {}\n'.format(stack, samples))
@@ -0,0 +1,69 @@
+import os
+import sys
+import zlib
+from sqlalchemy import select, func
+from models import Page
+import compression
+import database
+
+page_table = Page.__table__
+
+
+def compress_html(batch_size=500):  # pages stored as TEXT before compression, html_content is emptied
+    session = database.create_session()
+    last, converted, before, after = 0, 0, 0, 0
+    try:
+        while True:
+            rows = session.execute(select([page_table.c.id, page_table.c.html_content])
+                                   .where(page_table.c.id > last)
+                                   .where(page_table.c.html_content.isnot(None))
+                                   .where(page_table.c.html_compressed.is_(None))
+                                   .order_by(page_table.c.id).limit(batch_size)).fetchall()
+            if not rows:
+                break
+            for page_id, html in rows:
+                data = compression.compress(html)
+                session.execute(page_table.update().where(page_table.c.id == page_id)
+                                .values(html_compressed=data, html_content=None))
+                before += len(html.encode('utf-8'))
+                after += len(data)
+            session.commit()
+            last = rows[-1][0]
+            converted += len(rows)
+            print('COMPRESSED: ', converted, 'pages', '{:.1f}MB -> {:.1f}MB'.format(before / 2 ** 20, after / 2 ** 20))
+    finally:
+        session.close()
+    return converted
+
+
+def train_dictionary(samples=2000, path=compression.DICTIONARY):
+    # run before the first crawl or migration, pages compressed with a dictionary need the same one to be read, so a
+    # retrained dictionary keeps the previous one next to it
+    session = database.create_session()
+    try:
+        rows = session.execute(select([page_table.c.html_content, page_table.c.html_compressed])
+                               .where(page_table.c.page_type_code == 'HTML')
+                               .order_by(func.random()).limit(samples))
+        pages = [html if html is not None else compression.decompress(data) for html, data in rows]
+    finally:
+        session.close()
+
+    dictionary = compression.train_dictionary([html for html in pages if html])
+    previous = compression.load_dictionary(path)
+    if previous:  # pages compressed with it are read through a copy named by its dict_id
+        archive = compression.archive_path(zlib.crc32(previous), path)
+        if not os.path.exists(archive):
+            with open(archive, 'wb') as f:
+                f.write(previous)
+        print('ARCHIVED: ', archive)
+    with open(path, 'wb') as f:
+        f.write(dictionary)
+    print('DICTIONARY: ', path, len(dictionary), 'bytes from', len(pages), 'pages')
+
+
+# MAIN
+if __name__ == '__main__':
+    if 'dictionary' in sys.argv[1:]:  # python migrate.py dictionary, train the shared dictionary on stored pages
+        train_dictionary()
+    else:  # python migrate.py, compress pages stored as TEXT (VACUUM on Postgres afterwards frees the space)
+        compress_html()
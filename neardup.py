@@ -0,0 +1,96 @@
+import hashlib
+import re
+import threading
+from lxml import html as lxml_html
+from lxml.etree import ParserError
+from models import Page
+
+WORDS = re.compile(r'\w+', re.UNICODE)
+DIGITS = re.compile(r'\d+')
+
+
+def page_text(html):  # visible text, session tokens, CSRF fields and scripts are not part of it
+    try:
+        doc = lxml_html.fromstring(html.encode('utf-8'), parser=lxml_html.HTMLParser(encoding='utf-8'))
+    except ParserError:
+        return ''
+    for element in doc.xpath('//script|//style|//noscript|//input'):
+        element.drop_tree()
+    return doc.text_content()
+
+
+def tokens(text):  # numbers (dates, times, counters) are masked
+    return [DIGITS.sub('0', word) for word in WORDS.findall(text.lower())]
+
+
+def simhash(words, shingle=3):  # 64-bit SimHash of word shingles, similar texts differ in few bits
+    weights = [0] * 64
+    for i in range(max(len(words) - shingle + 1, 1)):
+        h = int.from_bytes(hashlib.blake2b(' '.join(words[i:i + shingle]).encode('utf-8'),
+                                           digest_size=8).digest(), 'little')
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def signed(value):  # stored in a signed BIGINT column
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def url_key(url):
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+# LSH index of SimHashes: the 64 bits are split into distance + 1 bands, two hashes within distance bits of each
+# other share at least one band exactly, so a lookup only compares fingerprints in the same band buckets
+class SimHashIndex:
+
+    def __init__(self, distance=3, min_words=50):
+        self.distance = distance  # max differing bits of near duplicates
+        self.min_words = min_words  # shorter pages are not compared, their SimHash is too noisy
+        self.bands = distance + 1
+        self.width = 64 // self.bands
+        self.buckets = [dict() for _ in range(self.bands)]  # band value -> list of (simhash, url key)
+        self.lock = threading.Lock()
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def keys(self, value):
+        mask = (1 << self.width) - 1
+        return [(value >> (i * self.width)) & mask for i in range(self.bands)]
+
+    def warm(self, session, batch_size=10000):  # SimHashes of stored pages at startup
+        rows = session.query(Page.url, Page.simhash).filter(Page.simhash.isnot(None)).yield_per(batch_size)
+        for url, value in rows:
+            self.add(value & ((1 << 64) - 1), url)
+
+    def add(self, value, url):
+        with self.lock:
+            self.insert(value, url_key(url))
+
+    def insert(self, value, key):
+        entry = (value, key)
+        for bucket, band in zip(self.buckets, self.keys(value)):
+            bucket.setdefault(band, list()).append(entry)
+        self.size += 1
+
+    def find(self, value, key):  # url key of a near duplicate stored under another URL, or None
+        for bucket, band in zip(self.buckets, self.keys(value)):
+            for other, other_key in bucket.get(band, ()):
+                if other_key != key and bin(value ^ other).count('1') <= self.distance:
+                    return other_key
+        return None
+
+    def check(self, html, url):  # (simhash, near duplicate), simhash is None for short pages
+        words = tokens(page_text(html))
+        if len(words) < self.min_words:
+            return None, False
+        value = simhash(words)
+        key = url_key(url)
+        with self.lock:  # find and add at once, so one of two near duplicates crawled together is kept
+            if self.find(value, key) is not None:
+                return value, True
+            self.insert(value, key)
+        return value, False
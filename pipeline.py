@@ -0,0 +1,61 @@
+import threading
+from queue import Queue
+import metrics
+
+STOP = object()
+
+
+# one stage of the crawl pipeline: bounded queue and own worker threads, put blocks while the stage is full, so a
+# slow stage holds back the stages before it instead of piling up results in memory
+class Stage:
+
+    def __init__(self, name, function, workers, size=100):
+        self.name = name
+        self.function = function  # called with each item, passes its result on to the next stage
+        self.workers = workers
+        self.queue = Queue(maxsize=size)
+        self.threads = [threading.Thread(target=self.run, name='{}-{}'.format(name, i), daemon=True)
+                        for i in range(workers)]
+        self.lock = threading.Lock()
+        self.pending = 0  # queued and in progress
+        self.done = 0
+
+    def __len__(self):
+        return self.pending
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def put(self, item):
+        with self.lock:
+            self.pending += 1
+        with metrics.timer(self.name + '_wait'):  # time blocked by backpressure
+            self.queue.put(item)
+
+    def close(self):  # process queued items and stop
+        for _ in self.threads:
+            self.queue.put(STOP)
+        for thread in self.threads:
+            thread.join()
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            if item is STOP:
+                return
+            try:
+                with metrics.timer(self.name + '_stage'):
+                    self.function(item)
+            except Exception as e:  # item is dropped, stage goes on
+                metrics.error(self.name, e)
+                print('PROBLEM: ', e)
+            finally:
+                with self.lock:
+                    self.pending -= 1
+                    self.done += 1
+
+    def stats(self):
+        with self.lock:
+            return {'workers': self.workers, 'queue': self.queue.qsize(), 'size': self.queue.maxsize,
+                    'pending': self.pending, 'done': self.done}
@@ -0,0 +1,125 @@
+import threading
+import time
+import requests
+from cachetools import LRUCache
+from reppy.robots import Robots
+from models import Site
+import database
+
+
+class RobotsUnavailable(Exception):  # robots.txt could not be fetched, host is skipped until the entry expires
+    pass
+
+
+# robots.txt of each site, shared by all workers: one fetch per site at a time (single flight), entries expire
+# after ttl, failures are cached for a shorter time, least recently used sites are evicted
+class RobotsCache:
+
+    def __init__(self, fetcher, ttl=24 * 3600, error_ttl=600, max_sites=10000):
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.entries = LRUCache(maxsize=max_sites)  # domain -> (robots, content, expires, error)
+        self.pending = dict()  # domain -> event of the fetch in flight
+        self.lock = threading.Lock()
+
+        self.hits = 0  # metrics
+        self.fetches = 0
+        self.errors = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def warm(self, session):  # robots.txt stored with each site, restarts do not fetch them again
+        expires = time.time() + self.ttl
+        for domain, content in session.query(Site.domain, Site.robots_content):
+            if content is not None:
+                robots = Robots.parse('http://{}/robots.txt'.format(domain), content)
+                with self.lock:
+                    self.entries[domain] = (robots, content, expires, None)
+
+    def cached(self, domain):  # robots or None, raises RobotsUnavailable for a cached failure
+        with self.lock:
+            entry = self.entries.get(domain)
+            if entry is None or entry[2] < time.time():
+                return None
+            self.hits += 1
+        robots, content, expires, error = entry
+        if error is not None:
+            raise RobotsUnavailable(error)
+        return robots
+
+    def wait(self, domain):  # seconds until a cached failure expires and robots.txt is fetched again
+        with self.lock:
+            entry = self.entries.get(domain)
+        return max(entry[2] - time.time(), 0) if entry is not None and entry[3] is not None else 0
+
+    def content(self, domain):
+        with self.lock:
+            entry = self.entries.get(domain)
+        return entry[1] if entry is not None else ''
+
+    def get(self, domain, root_url):
+        while True:
+            robots = self.cached(domain)
+            if robots is not None:
+                return robots
+
+            with self.lock:
+                event = self.pending.get(domain)
+                fetch = event is None
+                if fetch:
+                    event = self.pending[domain] = threading.Event()
+
+            if not fetch:  # another worker is fetching, wait for its result
+                event.wait()
+                continue
+
+            try:
+                self.fetch(domain, root_url)
+            finally:
+                with self.lock:
+                    del self.pending[domain]
+                event.set()
+
+    def fetch(self, domain, root_url):
+        url = root_url + '/robots.txt'
+        try:
+            response = self.fetcher.session.get(url, timeout=self.fetcher.timeout)
+        except requests.RequestException as e:
+            self.failed(domain, e)
+            return
+        self.store(domain, url, response.status_code, response.text)
+
+    def store(self, domain, url, status_code, content):
+        if status_code >= 500:  # server error, try again later
+            self.failed(domain, 'HTTP {}'.format(status_code))
+            return
+        if status_code != 200:  # no robots.txt, everything allowed
+            content = ''
+
+        robots = Robots.parse(url, content)
+        with self.lock:
+            refresh = domain in self.entries
+            self.entries[domain] = (robots, content, time.time() + self.ttl, None)
+            self.fetches += 1
+        if refresh:
+            self.persist(domain, content)
+
+    def failed(self, domain, error):
+        with self.lock:
+            self.entries[domain] = (None, '', time.time() + self.error_ttl, str(error))
+            self.errors += 1
+
+    def persist(self, domain, content):  # refreshed robots.txt of a stored site, new sites are stored by the writer
+        session = database.create_session()
+        try:
+            session.query(Site).filter(Site.domain == domain).update({Site.robots_content: content},
+                                                                     synchronize_session=False)
+            session.commit()
+        finally:
+            session.close()
+
+    def stats(self):
+        with self.lock:
+            return {'sites': len(self.entries), 'hits': self.hits, 'fetches': self.fetches, 'errors': self.errors}
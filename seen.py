@@ -0,0 +1,119 @@
+import hashlib
+import math
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from cachetools import LRUCache
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):  # one key for all spellings of a URL
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        host = '{}:{}'.format(host, port)
+
+    path = parts.path or '/'
+    if len(path) > 1 and path.endswith('/'):
+        path = path.rstrip('/') or '/'
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ''))  # fragment dropped
+
+
+def fingerprint(url):  # two 64-bit hashes of the normalized URL
+    digest = hashlib.blake2b(normalize_url(url).encode('utf-8'), digest_size=16).digest()
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+
+class BloomFilter:
+
+    def __init__(self, capacity, error):
+        self.capacity = capacity
+        self.bits = max(int(-capacity * math.log(error) / math.log(2) ** 2), 8)
+        self.hashes = max(int(round(self.bits / capacity * math.log(2))), 1)
+        self.array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def positions(self, h1, h2):  # double hashing, k positions from two hashes
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def __contains__(self, hashes):
+        return all(self.array[p >> 3] & (1 << (p & 7)) for p in self.positions(*hashes))
+
+    def add(self, hashes):
+        for p in self.positions(*hashes):
+            self.array[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+
+# seen URLs as fingerprints in a scalable Bloom filter (filters of growing capacity and shrinking error rate),
+# about 3.6 bytes per URL at 1e-6 error when sized for the whole crawl (10M URLs in ~36MB instead of ~1.3GB for a
+# set of URL strings), the defaults (1M, growth 4) allocate 1M + 4M + 16M filters by 10M URLs, ~82MB + the LRU,
+# possible false positives are confirmed against URLs added but not stored as crawled pages (exact) and the page
+# table, so only URLs that never reach the page table (not HTML, failed, skipped) stay in memory exactly
+class UrlSeen:
+
+    def __init__(self, capacity=1000000, error=1e-6, growth=4, tightening=0.5, recent=100000, lookup=None):
+        self.capacity = capacity
+        self.error = error * (1 - tightening)  # total error stays under error over all filters
+        self.growth = growth
+        self.tightening = tightening
+        self.filters = [BloomFilter(capacity, self.error)]
+        self.recent = LRUCache(maxsize=recent)  # fingerprints of recently added URLs, saves lookups
+        self.pending = set()  # fingerprints of added URLs not stored as crawled pages, exact until stored()
+        self.lookup = lookup  # url -> True if page is crawled, exact check for Bloom hits
+        self.lock = threading.Lock()
+        self.size = 0
+        self.lookups = 0  # metrics
+        self.false_positives = 0
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, url):
+        hashes = fingerprint(url)
+        with self.lock:
+            if not any(hashes in bloom for bloom in self.filters):
+                return False
+            if hashes[0] in self.recent or hashes[0] in self.pending:
+                return True
+            if self.lookup is None:
+                return True
+            self.lookups += 1
+
+        if self.lookup(url):
+            with self.lock:
+                self.recent[hashes[0]] = True
+            return True
+        with self.lock:
+            self.false_positives += 1
+        return False
+
+    def add(self, url, stored=False):  # stored: page is in DB already, e.g. on resume
+        hashes = fingerprint(url)
+        with self.lock:
+            self.recent[hashes[0]] = True
+            if not stored:  # in the pipeline, or never stored (not HTML, failed, skipped), lookup would miss it
+                self.pending.add(hashes[0])
+            if any(hashes in bloom for bloom in self.filters):
+                return
+            bloom = self.filters[-1]
+            if bloom.count >= bloom.capacity:  # full, add a larger filter with lower error
+                bloom = BloomFilter(bloom.capacity * self.growth,
+                                    self.error * self.tightening ** len(self.filters))
+                self.filters.append(bloom)
+            bloom.add(hashes)
+            self.size += 1
+
+    def stored(self, urls):  # pages written by the writer, the lookup finds them from now on
+        with self.lock:
+            for url in urls:
+                self.pending.discard(fingerprint(url)[0])
+
+    def memory(self):  # bytes used by the filters
+        return sum(len(bloom.array) for bloom in self.filters)
@@ -0,0 +1,84 @@
+import datetime
+import zlib
+from lxml import etree
+
+NS = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+MAX_FEED = 64 * 1024  # bytes of XML given to the parser at once
+
+
+def parse_lastmod(text):  # W3C datetime, only the date is used
+    try:
+        return datetime.datetime.strptime(text.strip()[:10], '%Y-%m-%d').date()
+    except (AttributeError, ValueError):
+        return None
+
+
+def iter_entries(chunks):  # (kind, loc, lastmod) of a sitemap or sitemap index, kind is 'url' or 'sitemap'
+    parser = etree.XMLPullParser(events=('end',), tag=(NS + 'url', NS + 'sitemap', 'url', 'sitemap'),
+                                 recover=True, huge_tree=True)
+    decompressor = None
+    for chunk in chunks:  # bytes, a .xml.gz file is recognized by the gzip magic of its first chunk
+        if decompressor is None:
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if chunk[:2] == b'\x1f\x8b' else False
+        while chunk:
+            if decompressor:  # bounded output, a compressed chunk can expand to megabytes of entries
+                data, chunk = decompressor.decompress(chunk, MAX_FEED), decompressor.unconsumed_tail
+            else:
+                data, chunk = chunk, b''
+            parser.feed(data)
+            for entry in read_entries(parser):
+                yield entry
+    if decompressor:
+        parser.feed(decompressor.flush())
+    parser.close()
+    for entry in read_entries(parser):
+        yield entry
+
+
+def read_entries(parser):
+    for event, element in parser.read_events():
+        loc = element.findtext(NS + 'loc') or element.findtext('loc')
+        lastmod = element.findtext(NS + 'lastmod') or element.findtext('lastmod')
+        kind = etree.QName(element).localname
+        element.clear()  # memory stays constant, parsed entries are dropped
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+        if loc:
+            yield kind, loc.strip(), parse_lastmod(lastmod)
+
+
+# sitemaps are streamed and parsed incrementally, gzip and nested sitemap indexes included
+class SitemapReader:
+
+    def __init__(self, fetcher, max_depth=3, max_sitemaps=500):
+        self.fetcher = fetcher
+        self.max_depth = max_depth  # sitemap index nesting
+        self.max_sitemaps = max_sitemaps  # per site
+
+    def urls(self, sitemaps, since=None):  # (url, lastmod) of all pages, skips sitemaps not modified since
+        visited = set()
+        pending = [(url, 0) for url in sitemaps]
+        while pending and len(visited) < self.max_sitemaps:
+            url, depth = pending.pop()
+            if url in visited:
+                continue
+            visited.add(url)
+
+            try:
+                for kind, loc, lastmod in self.entries(url):
+                    if kind == 'sitemap':
+                        if depth < self.max_depth and (since is None or lastmod is None or lastmod >= since):
+                            pending.append((loc, depth + 1))
+                    else:
+                        yield loc, lastmod
+            except Exception as e:
+                print('PROBLEM: ', url, e)
+
+    def entries(self, url, chunk_size=64 * 1024):
+        response = self.fetcher.session.get(url, timeout=self.fetcher.timeout, stream=True)
+        try:
+            response.raise_for_status()
+            for entry in iter_entries(response.iter_content(chunk_size)):  # Content-Encoding: gzip is undone here
+                yield entry
+        finally:
+            response.close()
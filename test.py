@@ -79,6 +79,15 @@ def firefox_setup():
     driver.close()
 
 
+def download_memory(url):  # peak RSS must stay flat however large the file is
+    import resource
+    from fetcher import Fetcher
+
+    data = Fetcher().download(url)
+    print('size: ', None if data is None else len(data))
+    print('peak RSS (KB): ', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
 def chrome_setup():
     options = webdriver.ChromeOptions()
     options.add_argument("headless")
@@ -212,12 +221,138 @@ def uniqueness(s):
             print(e)
 
 
+def dedup_benchmark():  # per page duplicate check cost must stay flat as the page table grows
+    import os
+    import time
+    from dedup import HashIndex
+
+    index = HashIndex()
+    hashes = list()
+    for size in [1000, 10000, 100000, 1000000]:
+        while len(index) < size:
+            hashed = hashlib.md5(os.urandom(16)).hexdigest()
+            index.add(hashed)
+            if len(hashes) < 100000:
+                hashes.append(hashed)
+
+        probes = [hashlib.md5(os.urandom(16)).hexdigest() for _ in range(10000)]
+        start = time.perf_counter()
+        for hashed in probes:
+            hashed in index
+        indexed = (time.perf_counter() - start) / len(probes)
+
+        start = time.perf_counter()
+        for hashed in probes[:10]:
+            hashed in hashes  # previous implementation, list of all hashes (capped at 100k)
+        scanned = (time.perf_counter() - start) / 10
+
+        print('pages: {:>8}  set: {:.2f}us  list scan: {:.2f}us'.format(size, indexed * 1e6, scanned * 1e6))
+
+
+def frontier_benchmark(s):  # cost of the durable frontier: resume time, crawl time is the in-memory queue
+    import time
+    from frontier import HostFrontier
+
+    frontier = HostFrontier(default_delay=0)
+    urls = ['https://host{}.gov.si/page{}'.format(i % 100, i) for i in range(100000)]
+    start = time.perf_counter()
+    for url in urls:
+        frontier.put(url)
+    for _ in urls:
+        frontier.get(timeout=0)
+    print('in-memory put+get: {:.2f}us'.format((time.perf_counter() - start) / len(urls) * 1e6))
+
+    start = time.perf_counter()
+    rows = s.query(Page.url).filter(Page.page_type_code == 'FRONTIER').order_by(Page.id).yield_per(10000)
+    count = sum(1 for _ in rows)
+    print('resume: {} frontier pages in {:.2f}s'.format(count, time.perf_counter() - start))
+
+
+def seen_benchmark():  # memory of seen URLs, set of strings against fingerprints in a Bloom filter
+    import time
+    import tracemalloc
+    from seen import UrlSeen
+
+    for size in [100000, 1000000]:
+        urls = ['https://www.host{}.gov.si/podrocja/page/{}?id={}'.format(i % 500, i, i * 7) for i in range(size)]
+
+        tracemalloc.start()
+        scraped = set(urls)
+        strings = tracemalloc.get_traced_memory()[0] + sum(len(url) + 49 for url in urls)
+        tracemalloc.stop()
+        del scraped
+
+        seen = UrlSeen(capacity=size)
+        start = time.perf_counter()
+        for url in urls:
+            seen.add(url)
+        added = (time.perf_counter() - start) / size
+        start = time.perf_counter()
+        misses = sum(1 for url in urls[:100000] if url + 'x' in seen)
+        checked = (time.perf_counter() - start) / 100000
+
+        print('urls: {:>8}  set: {:.0f}MB  bloom: {:.1f}MB  add: {:.1f}us  check: {:.1f}us  false positives: {}'.format(
+            size, strings / 2 ** 20, seen.memory() / 2 ** 20, added * 1e6, checked * 1e6, misses))
+    print('per 10M URLs: {:.0f}MB'.format(UrlSeen(capacity=10000000).memory() / 2 ** 20))
+
+
+def neardup_benchmark():  # near duplicate lookup cost must stay sub-linear as the index grows
+    import random
+    import time
+    from neardup import SimHashIndex
+
+    index = SimHashIndex()
+    for size in [1000, 10000, 100000, 1000000]:
+        while len(index) < size:
+            index.add(random.getrandbits(64), 'https://www.gov.si/{}'.format(len(index)))
+
+        probes = [random.getrandbits(64) for _ in range(10000)]
+        start = time.perf_counter()
+        for value in probes:
+            index.find(value, 0)
+        lookup = (time.perf_counter() - start) / len(probes)
+        print('pages: {:>8}  lookup: {:.2f}us'.format(size, lookup * 1e6))
+
+    vocabulary = ['vlada', 'republike', 'slovenije', 'obvestilo', 'seja', 'ministrstvo', 'zakon', 'uredba', 'javni',
+                  'razpis', 'davek', 'prostor', 'podatki', 'storitve', 'e-uprava', 'evem', 'vloga', 'dovoljenje']
+    text = ' '.join(random.choice(vocabulary) for _ in range(500))
+    a = index.check('<p>{}</p><p>Datum: 17.10.2026 10:32</p>'.format(text), 'https://a.gov.si/1')
+    b = index.check('<p>{}</p><p>Datum: 18.10.2026 09:05</p><input value="8f3ac"/>'.format(text), 'https://a.gov.si/2')
+    print('near duplicate detected: ', a[1] is False and b[1] is True)
+
+
+def graph_benchmark():  # link graph memory and update cost, priority order should follow link weight
+    import random
+    import resource
+    import time
+    from graph import LinkGraph
+
+    graph = LinkGraph()
+    graph.seed('https://www.gov.si/0')
+    pages, links = 100000, 20
+    start = time.perf_counter()
+    for page in range(pages):
+        graph.add_page('https://www.gov.si/{}'.format(page),
+                       ['https://www.gov.si/{}'.format(int(random.paretovariate(1)) * page % pages)
+                        for _ in range(links)])
+    update = (time.perf_counter() - start) / pages
+    graph.compact()
+    start = time.perf_counter()
+    rank = graph.pagerank(iterations=10)
+    print('nodes: {}  edges: {}  update: {:.1f}us/page  peak RSS: {:.1f}MB  pagerank: {:.1f}s'.format(
+        len(graph), graph.edges(), update * 1e6, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        time.perf_counter() - start))
+    top = sorted(range(len(graph)), key=lambda i: -rank[i])[:10]
+    print('top pages by pagerank, in-degree: ', [(i, graph.indegree[i]) for i in top])
+
+
 # MAIN
 # java -jar selenium-server-standalone-3.141.59.jar
 
 #firefox_setup()
 #chrome_setup()
 #phantomjs_setup()
+#dedup_benchmark()
 
 meta = MetaData(schema="crawldb")
 Base = declarative_base(metadata=meta)
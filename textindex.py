@@ -0,0 +1,204 @@
+import base64
+import binascii
+import io
+import math
+import os
+import re
+import sqlite3
+import sys
+import time
+import zipfile
+import zlib
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from lxml import etree
+from sqlalchemy import select
+from models import Page, PageData, Blob
+import database
+
+try:
+    from pdfminer.high_level import extract_text as pdfminer_text
+except ImportError:  # optional, a simple parser of PDF text operators is used without it
+    pdfminer_text = None
+
+page_table = Page.__table__
+page_data_table = PageData.__table__
+blob_table = Blob.__table__
+
+WORDS = re.compile(r'\w{2,}', re.UNICODE)
+PDF_STREAM = re.compile(rb'stream\r?\n(.*?)\r?\nendstream', re.S)
+PDF_TEXT = re.compile(rb'\((.*?)(?<!\\)\)\s*(?:Tj|\'|")|\[(.*?)\]\s*TJ', re.S)
+PDF_STRING = re.compile(rb'\((.*?)(?<!\\)\)', re.S)
+OLE_TEXT = re.compile(rb'(?:[\x20-\x7e\xc0-\xff]\x00){4,}|[\x20-\x7e]{6,}')  # UTF-16LE and ASCII runs
+OOXML_PARTS = {'DOCX': re.compile(r'word/(document|header\d*|footer\d*)\.xml$'),
+               'PPTX': re.compile(r'ppt/slides/slide\d+\.xml$')}
+INDEX = os.environ.get('CRAWLDB_INDEX', 'data/index.db')
+
+
+def content(data):  # rows stored before the blob table hold base64 of the file
+    data = bytes(data)
+    try:
+        return base64.b64decode(data, validate=True)
+    except (binascii.Error, ValueError):
+        return data
+
+
+def pdf_text(data):
+    if pdfminer_text is not None:
+        return pdfminer_text(io.BytesIO(data))
+    parts = list()
+    for stream in PDF_STREAM.findall(data):  # content streams, mostly FlateDecode
+        try:
+            stream = zlib.decompress(stream)
+        except zlib.error:
+            pass
+        for single, array in PDF_TEXT.findall(stream):
+            strings = [single] if single else PDF_STRING.findall(array)
+            parts += [string.decode('latin-1') for string in strings]
+    return ' '.join(parts)
+
+
+def ooxml_text(data, data_type):  # DOCX and PPTX are zipped XML, text is in the w:t and a:t elements
+    parts = list()
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        for name in archive.namelist():
+            if OOXML_PARTS[data_type].match(name):
+                root = etree.fromstring(archive.read(name))
+                parts += [element.text or '' for element in root.iter('{*}t')]
+    return ' '.join(parts)
+
+
+def ole_text(data):  # DOC and PPT are binary OLE files, text is kept as UTF-16LE or single byte runs
+    parts = list()
+    for run in OLE_TEXT.findall(data):
+        parts.append(run.decode('utf-16-le') if run[1:2] == b'\x00' else run.decode('latin-1'))
+    return ' '.join(parts)
+
+
+def extract_text(data_type, data):
+    data = content(data)
+    if data_type == 'PDF':
+        return pdf_text(data)
+    if data_type in OOXML_PARTS:
+        try:
+            return ooxml_text(data, data_type)
+        except zipfile.BadZipFile:  # .docx link to an old format file
+            return ole_text(data)
+    return ole_text(data)
+
+
+def index_documents(documents):  # runs in worker processes: (page_id, data type, data) -> (page_id, term counts)
+    results = list()
+    for page_id, data_type, data in documents:
+        try:
+            text = extract_text(data_type, data)
+        except Exception as e:  # broken file, indexed without terms
+            print('PROBLEM: ', page_id, e)
+            text = ''
+        results.append((page_id, Counter(word.lower() for word in WORDS.findall(text))))
+    return results
+
+
+# inverted index of stored documents in a local SQLite file, updated incrementally: rows of page_data after the
+# last indexed one are streamed from the crawl database, text is extracted on all cores, the terms of each page_id
+# replace its previous ones
+class TextIndex:
+
+    def __init__(self, path=INDEX):
+        self.db = sqlite3.connect(path)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS document (page_id INTEGER PRIMARY KEY, url TEXT, data_type TEXT, words INTEGER);
+            CREATE TABLE IF NOT EXISTS posting (term TEXT, page_id INTEGER, count INTEGER,
+                                                PRIMARY KEY (term, page_id)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS posting_page_idx ON posting (page_id);
+            CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER);
+        ''')
+
+    def close(self):
+        self.db.close()
+
+    def last_row(self):  # id of the last indexed page_data row
+        row = self.db.execute("SELECT value FROM state WHERE key = 'page_data'").fetchone()
+        return row[0] if row else 0
+
+    def update(self, page_id, url, data_type, terms):  # terms of the page replace the indexed ones
+        self.db.execute('DELETE FROM posting WHERE page_id = ?', (page_id,))
+        self.db.execute('INSERT OR REPLACE INTO document VALUES (?, ?, ?, ?)',
+                        (page_id, url, data_type, sum(terms.values())))
+        self.db.executemany('INSERT INTO posting VALUES (?, ?, ?)',
+                            [(term, page_id, count) for term, count in terms.items()])
+
+    def rows(self, batch_size):  # new page_data rows in batches, server side cursor on Postgres
+        query = select([page_data_table.c.id, page_data_table.c.page_id, page_table.c.url,
+                        page_data_table.c.data_type_code, blob_table.c.data, page_data_table.c.data]) \
+            .select_from(page_data_table.join(page_table, page_table.c.id == page_data_table.c.page_id)
+                         .outerjoin(blob_table, blob_table.c.hash == page_data_table.c.blob_hash)) \
+            .where(page_data_table.c.id > self.last_row()).order_by(page_data_table.c.id)
+        connection = database.get_engine().connect()
+        try:
+            result = connection.execution_options(stream_results=True).execute(query)
+            for rows in iter(lambda: result.fetchmany(batch_size), []):
+                yield rows
+        finally:
+            connection.close()
+
+    def build(self, workers=None, batch_size=100):  # returns number of indexed documents
+        workers = workers or os.cpu_count()
+        start = time.time()
+        indexed = 0
+        pending = list()  # batches in the pool, at most two per worker keeps memory bounded
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for rows in self.rows(batch_size):
+                documents = [(page_id, data_type, blob if blob is not None else data)
+                             for row_id, page_id, url, data_type, blob, data in rows
+                             if blob is not None or data is not None]
+                info = {page_id: (url, data_type) for row_id, page_id, url, data_type, blob, data in rows}
+                pending.append((pool.submit(index_documents, documents), info, rows[-1][0]))
+                while len(pending) >= 2 * workers:
+                    indexed += self.store(*pending.pop(0))
+            while pending:
+                indexed += self.store(*pending.pop(0))
+
+        elapsed = max(time.time() - start, 1e-9)
+        print('INDEXED: ', indexed, 'documents', '{:.1f}/s'.format(indexed / elapsed),
+              '{:.1f}/s per core'.format(indexed / elapsed / workers))
+        return indexed
+
+    def store(self, future, info, last_row):  # results of one batch, committed with the position in page_data
+        results = future.result()
+        for page_id, terms in results:
+            url, data_type = info[page_id]
+            self.update(page_id, url, data_type, terms)
+        self.db.execute("INSERT OR REPLACE INTO state VALUES ('page_data', ?)", (last_row,))
+        self.db.commit()
+        return len(results)
+
+    def search(self, query, limit=10):  # (url, score) ranked by tf-idf
+        terms = [word.lower() for word in WORDS.findall(query)]
+        if not terms:
+            return list()
+        documents = self.db.execute('SELECT COUNT(*) FROM document').fetchone()[0]
+        scores = Counter()
+        for term in set(terms):
+            postings = self.db.execute('SELECT p.page_id, p.count, d.words FROM posting p '
+                                       'JOIN document d ON d.page_id = p.page_id WHERE p.term = ?', (term,)).fetchall()
+            if not postings:
+                continue
+            idf = math.log(1 + documents / len(postings))
+            for page_id, count, words in postings:
+                scores[page_id] += count / max(words, 1) * idf
+        urls = dict(self.db.execute('SELECT page_id, url FROM document WHERE page_id IN ({})'.format(
+            ','.join('?' * len(scores))), list(scores)).fetchall()) if scores else dict()
+        return [(urls[page_id], score) for page_id, score in scores.most_common(limit)]
+
+
+# MAIN
+if __name__ == '__main__':
+    index = TextIndex()
+    if 'search' in sys.argv[1:]:  # python textindex.py search <words>
+        for url, score in index.search(' '.join(sys.argv[sys.argv.index('search') + 1:])):
+            print('{:.4f} {}'.format(score, url))
+    else:  # python textindex.py, index documents stored since the last run
+        index.build()
+    index.close()
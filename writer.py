@@ -0,0 +1,230 @@
+import threading
+import time
+from queue import Queue, Empty
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from models import Site, Page, Image, PageData, Link
+from cluster import host_slot
+import database
+import metrics
+
+site_table = Site.__table__
+page_table = Page.__table__
+image_table = Image.__table__
+page_data_table = PageData.__table__
+link_table = Link.__table__
+
+
+def chunks(rows, size=500):  # keep statements under the bind parameter limit
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+
+# single writer thread, crawl results are queued by workers and written in batched transactions,
+# one multi-row insert per table and batch instead of a commit per row
+class DbWriter(threading.Thread):
+
+    def __init__(self, batch_size=50, flush_interval=1.0, max_queued=500, on_stored=None):
+        threading.Thread.__init__(self, daemon=True)
+        self.queue = Queue(maxsize=max_queued)  # workers block when writer falls behind
+        self.batch_size = batch_size  # crawl results per transaction
+        self.flush_interval = flush_interval  # seconds before a partial batch is written
+        self.sites = dict()  # site id of each domain
+        self.on_stored = on_stored  # called with the URLs of crawled pages after their commit
+        self.written = 0
+
+    def put(self, result):
+        self.queue.put(result)
+
+    def close(self):  # write remaining results and stop
+        self.queue.put(None)
+        self.join()
+
+    def run(self):
+        session = database.create_session()
+        postgres = session.bind.dialect.name == 'postgresql'
+        self.upsert = self.upsert_postgres if postgres else self.upsert_generic
+        self.insert_ignore = self.insert_ignore_postgres if postgres else self.insert_ignore_generic
+
+        stop = False
+        while not stop:
+            batch = list()
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    result = self.queue.get(timeout=max(deadline - time.time(), 0.01))
+                except Empty:
+                    break
+                if result is None:
+                    stop = True
+                    break
+                batch.append(result)
+
+            if batch:
+                try:
+                    with metrics.timer('db_write'):
+                        self.write(session, batch)
+                except Exception as e:
+                    metrics.error('db_write', e)
+                    print('PROBLEM: ', e)
+        session.close()
+
+    def write(self, session, batch):
+        try:
+            self.commit(session, batch)
+        except IntegrityError:  # HTML hash stored meanwhile by another crawler, retry results one by one
+            for result in batch:
+                try:
+                    try:
+                        self.commit(session, [result])
+                    except IntegrityError:  # links of duplicates are crawled from the original page
+                        result.update({'page_type_code': 'DUPLICATE', 'links': list(), 'images': list(),
+                                       'binaries': list()})
+                        self.commit(session, [result])
+                except Exception as e:  # only this result is lost, not the rest of the batch
+                    metrics.error('db_write', e)
+                    print('PROBLEM: ', result.get('url'), e)
+
+    def commit(self, session, batch):
+        try:
+            self.write_batch(session, batch)
+            session.commit()
+            if self.on_stored is not None:
+                self.on_stored([result['url'] for result in batch if 'url' in result])
+            self.written += len(batch)
+            metrics.count('written', len(batch))
+        except:
+            session.rollback()
+            self.sites.clear()  # ids of sites inserted in this transaction are gone
+            raise
+
+    def write_batch(self, session, batch):
+        for result in batch:
+            self.site_id(session, result)
+        # sitemap results only have FRONTIER pages, not modified pages only a visit
+        crawled = [result for result in batch if 'url' in result and not result.get('not_modified')]
+
+        page_ids = dict()
+        for result in crawled:  # crawled pages, one upsert on url each
+            site_id = self.sites[result['domain']]
+            row = {'site_id': site_id, 'url': result['url'], 'page_type_code': result['page_type_code'],
+                   'host_slot': host_slot(result['url'])}
+            if result['page_type_code'] == 'HTML':
+                row.update({
+                    'html_content': None,  # legacy column, pages are stored compressed
+                    'html_compressed': result['html_compressed'],
+                    'http_status_code': result['status_code'],
+                    'accessed_time': result['accessed_time'],
+                    'hash': result['hash'],
+                    'etag': result['etag'],
+                    'last_modified': result['last_modified'],
+                    'revisit_interval': result['revisit_interval'],
+                    'next_visit': result['next_visit'],
+                    'simhash': result['simhash']
+                })
+            page_ids[result['url']] = self.upsert(session, row)
+
+        for result in batch:  # 304 on re-crawl, only the visit is recorded
+            if result.get('not_modified'):
+                session.execute(page_table.update().where(page_table.c.url == result['url']).values(
+                    accessed_time=result['accessed_time'],
+                    revisit_interval=result['revisit_interval'],
+                    next_visit=result['next_visit']
+                ))
+
+        frontier = list()  # newly found pages of all results
+        for result in batch:
+            site_id = self.sites[result['domain']]
+            frontier += [{'site_id': site_id, 'url': url, 'page_type_code': 'FRONTIER', 'host_slot': host_slot(url)}
+                         for url in result.get('links', ())]
+        self.insert_ignore(session, page_table, frontier)
+        ids = self.page_ids(session, [url for result in crawled for url in result['links']])
+
+        links = list()
+        for result in crawled:
+            from_page = page_ids[result['url']]
+            links += [{'from_page': from_page, 'to_page': ids[url]} for url in result['links'] if url in ids]
+        self.insert_ignore(session, link_table, links)
+
+        binaries = dict()  # only files that are not stored yet
+        for result in crawled:
+            site_id = self.sites[result['domain']]
+            for url, data_type, hashed in result['binaries']:
+                binaries[url] = (site_id, data_type, hashed, result['accessed_time'])
+        for url in self.page_ids(session, list(binaries)):
+            del binaries[url]
+
+        self.insert_ignore(session, page_table, [{
+            'site_id': site_id,
+            'url': url,
+            'page_type_code': 'BINARY',
+            'host_slot': host_slot(url),
+            'http_status_code': 200,
+            'accessed_time': accessed_time
+        } for url, (site_id, data_type, hashed, accessed_time) in binaries.items()])
+        ids = self.page_ids(session, list(binaries))
+        self.insert_many(session, page_data_table, [
+            {'page_id': ids[url], 'data_type_code': data_type, 'blob_hash': hashed}
+            for url, (site_id, data_type, hashed, accessed_time) in binaries.items() if url in ids])
+
+        images = list()
+        for result in crawled:
+            page_id = page_ids[result['url']]
+            images += [{
+                'page_id': page_id,
+                'filename': filename,
+                'content_type': content_type,
+                'blob_hash': hashed,
+                'accessed_time': result['accessed_time']
+            } for filename, content_type, hashed in result['images']]
+        self.insert_many(session, image_table, images)
+
+    def site_id(self, session, result):
+        domain = result['domain']
+        if domain not in self.sites:
+            row = session.execute(select([site_table.c.id]).where(site_table.c.domain == domain)).first()
+            if row is not None:
+                self.sites[domain] = row[0]
+            else:
+                self.sites[domain] = session.execute(site_table.insert().values(
+                    domain=domain,
+                    robots_content=result['robots_content'],
+                    sitemap_content=result['sitemap_content']
+                )).inserted_primary_key[0]
+        return self.sites[domain]
+
+    def page_ids(self, session, urls):
+        ids = dict()
+        for chunk in chunks(urls):
+            query = select([page_table.c.id, page_table.c.url]).where(page_table.c.url.in_(chunk))
+            for page_id, url in session.execute(query):
+                ids[url] = page_id
+        return ids
+
+    def insert_many(self, session, table, rows):
+        for chunk in chunks(rows):
+            session.execute(table.insert().values(chunk))  # multi-row VALUES
+
+    def upsert_postgres(self, session, row):
+        stmt = pg_insert(page_table).values(row)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[page_table.c.url],
+            set_={key: stmt.excluded[key] for key in row if key != 'url'}
+        ).returning(page_table.c.id)
+        return session.execute(stmt).scalar()
+
+    def upsert_generic(self, session, row):  # SQLite, plain insert so a hash conflict raises IntegrityError
+        page_id = session.execute(select([page_table.c.id]).where(page_table.c.url == row['url'])).scalar()
+        if page_id is None:
+            return session.execute(page_table.insert().values(row)).inserted_primary_key[0]
+        session.execute(page_table.update().where(page_table.c.id == page_id).values(row))
+        return page_id
+
+    def insert_ignore_postgres(self, session, table, rows):
+        for chunk in chunks(rows):
+            session.execute(pg_insert(table).values(chunk).on_conflict_do_nothing())
+
+    def insert_ignore_generic(self, session, table, rows):  # SQLite
+        for chunk in chunks(rows):
+            session.execute(table.insert().values(chunk).prefix_with('OR IGNORE'))